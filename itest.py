@@ -4,12 +4,18 @@ import getopt
 import json
 from settings import *
 import datetime
-from utils.tests import RestTest, SocketTest
+from utils.tests import RestTest, SocketTest, StreamSuite
 from utils.filereader import YamlReader
-from utils.binding import Context
-import string
+from utils.binding import Context, compile_template
+from utils.client import SESSION_POOL, TCP_POOL
+from utils.aio import ASYNC_ENGINE, ENGINES
+from utils.plancache import PLAN_CACHE
+from utils.histogram import LATENCY
+from utils.fixtures import SuiteFixtures, close_all as close_fixtures
+from utils.cassette import CASSETTE
+from utils.coalesce import RESPONSE_CACHE
 import unittest
-from utils.exceptions import FileTypeNotSupportException
+from utils.exceptions import FileTypeNotSupportException, ParameterError
 
 logger = logging.getLogger('itest')
 
@@ -27,27 +33,54 @@ Options:
   -r,  --report        Report name
   -t,  --text           TextTestRunner Report
   -w,  --web            HTMLTestRunner Report
+  -n,  --workers        Number of threads to run test cases concurrently
+  -s,  --stream         Run each suite as soon as it is parsed
+  -e,  --engine         Execution engine: thread (default) or asyncio
+       --load           Load test instead of running each case once
+       --users          Number of virtual users in load test
+       --duration       Seconds to run load test
+       --iterations     Iterations per virtual user in load test, or total iterations with --rate
+       --rate           Open model: start iterations at a fixed rate (50) or ramp over duration (50:500),
+                        needs --duration or --iterations
+       --case           Name of the case or suite to load test, default all cases
+       --record         Record every request and response to a cassette file
+       --replay         Replay responses from a cassette file instead of sending requests
 Examples:
   %(progname)s -p E:\\itest -f itest.json -r itest_report.html
+  %(progname)s -f itest.json --load --case 首页 --users 20 --duration 60
+  %(progname)s -f itest.json --record itest.cassette
 """
 
 
 class TestProgram(object):
 
-    def __init__(self, path=BASE_DIR, testfile='itest.json', report='itest', runner='text'):
+    def __init__(self, path=BASE_DIR, testfile='itest.json', report='itest', runner='text', workers=1, stream=False,
+                 engine=None):
         self.path = path
         self.testfile = testfile
         self.report = report
         self.runner = runner
+        self.workers = workers
+        self.stream = stream
+        self.engine = engine  # None: use engine in project
+        # load test
+        self.load = False
+        self.users = None
+        self.duration = None
+        self.iterations = None
+        self.case = None
+        self.rate = None
+        self.cassette = None  # (file, mode)，见 utils.cassette
         logger.debug('================ Begin Test ================')
 
     def parse_args(self, argv):
         argv = argv
         progname = argv[0]
-        long_opts = ['help', 'path=', 'file=', 'report=']
+        long_opts = ['help', 'path=', 'file=', 'report=', 'text', 'web', 'workers=', 'stream', 'engine=',
+                     'load', 'users=', 'duration=', 'iterations=', 'case=', 'rate=', 'record=', 'replay=']
         usage = USAGE % {'progname': progname}
         try:
-            options, args = getopt.getopt(argv[1:], 'hHp:f:r:tw', long_opts)
+            options, args = getopt.getopt(argv[1:], 'hHp:f:r:twn:se:', long_opts)
             for opt, value in options:
                 if opt in ('-h', '-H', '--help'):
                     print(usage)
@@ -73,6 +106,34 @@ class TestProgram(object):
                 elif opt in ('-w', '--web'):
                     self.runner = 'web'
                     logger.debug('Set HTMLTestRunner')
+                elif opt in ('-n', '--workers'):
+                    self.workers = int(value)
+                    logger.debug('Set workers: %d' % self.workers)
+                elif opt in ('-s', '--stream'):
+                    self.stream = True
+                    logger.debug('Set stream mode')
+                elif opt in ('-e', '--engine'):
+                    if value.lower() not in ENGINES:
+                        raise getopt.error('Unknown engine: %s' % value)
+                    self.engine = value.lower()
+                    logger.debug('Set engine: %s' % self.engine)
+                elif opt == '--load':
+                    self.load = True
+                    logger.debug('Set load mode')
+                elif opt == '--users':
+                    self.users = int(value)
+                elif opt == '--duration':
+                    self.duration = float(value)
+                elif opt == '--iterations':
+                    self.iterations = int(value)
+                elif opt == '--case':
+                    self.case = value
+                elif opt == '--rate':
+                    self.rate = value
+                elif opt in ('--record', '--replay'):
+                    if opt == '--replay' and not os.path.exists(value):
+                        raise getopt.error('Cassette not found: %s' % value)
+                    self.cassette = (value, opt[2:])
                 else:
                     print(usage)
         except getopt.error as msg:
@@ -87,61 +148,135 @@ class TestProgram(object):
 testcases = []
 
 
-class JsonParser(object):
-    def __init__(self, testfile):
+class Parser(object):
+    """ 测试文件解析基类。
+
+    子类的 normalize() 将测试文件解析为规范化的测试计划 (project, suites)：project 为 dict，
+    suites 为 [{'name', 'desc', 'sequential', 'cases': [{'name', 'desc', 'setup', 'test', 'teardown'}]}]，
+    测试计划可以序列化，按文件内容缓存在 PLAN_CACHE 中，文件未修改时不再重复解析。
+    """
+
+    def __init__(self, testfile, engine=None):
         self.testfile = testfile
         self.project = ''
-        self.api_type = ''
+        self.api_type = 'http'
         self.desc = ''
+        self.base = ''
+        self.ip = ''
+        self.port = ''
+        self.frame = None
+        self.engine = engine  # given on command line, overrides engine in project
+        self.context = Context()
+
+    def normalize(self):
+        """返回 (project, suites)，由子类实现"""
+        raise NotImplementedError
+
+    def plan(self):
+        """返回缓存或重新解析得到的 (project, suites)"""
+        cached = PLAN_CACHE.load(self.testfile, type(self))
+        if cached:
+            return cached
+        project, suites = self.normalize()
+        return project, PLAN_CACHE.save(self.testfile, project, suites, type(self))
 
     def parse(self):
+        testcases.extend(self.stream())
+
+    def stream(self):
+        """读取 project 信息，返回逐个解析、生成 TestSuite 的迭代器"""
+        project, suites = self.plan()
+        self.load_project(project)
+        return (self.build_suite(suite) for suite in suites)
+
+    def load_project(self, project):
+        self.project = project.get('name')
+        self.desc = project.get('desc') or ''
+        self.api_type = project.get('type') or 'http'
+        self.base = project.get('base') or ''
+        self.ip = project.get('ip')
+        self.port = project.get('port')
+        self.frame = project.get('frame')  # TCP response framing: {mode: delimiter, delimiter: /**end**/}
+        self.engine = (self.engine or project.get('engine') or 'thread').lower()
+        if self.engine not in ENGINES:
+            raise ParameterError('Unknown engine: %s, should be one of %s' % (self.engine, ', '.join(ENGINES)))
+        # debug
+        logger.debug('project: %s, desc: %s, type: %s' % (self.project, self.desc, self.api_type))
+
+        bindings = project.get('bindings')
+        if bindings:
+            self.context.bind_variables(bindings)
+
+        pool = project.get('pool')  # connection pool: {size: 10, keepalive: 60}
+        if pool:
+            SESSION_POOL.configure(**pool)
+            TCP_POOL.configure(**pool)
+            ASYNC_ENGINE.configure(**pool)
+
+        cache = project.get('cache')  # response cache for GET/HEAD/OPTIONS: true or {size: 1024}
+        RESPONSE_CACHE.configure(bool(cache), **(cache if isinstance(cache, dict) else {}))
+
+    def build_suite(self, suite):
+        """根据测试计划中的 suite 生成 unittest.TestSuite"""
+        test_suite = unittest.TestSuite()  # test suite definition
+        test_suite.name = suite.get('name')
+        test_suite.sequential = bool(suite.get('sequential'))  # cases in suite must run in order
+        fixtures = SuiteFixtures(suite.get('name'))  # setup / teardown with suite scope
+        for case in suite['cases']:
+            if self.api_type in ('http', 'rest', 'restful'):
+                # RESTFul interface (HTTP protocol)
+                test = RestTest(name=case['name'], test=case['test'], base=self.base, desc=case['desc'],
+                                setup=case['setup'], teardown=case['teardown'], context=self.context,
+                                engine=self.engine, fixtures=fixtures)
+                fixtures.register()
+            elif self.api_type in ('tcp', 'socket'):
+                # socket interface (TCP protocol)
+                test = SocketTest(name=case['name'], test=case['test'], ip=self.ip, port=self.port, desc=case['desc'],
+                                  setup=case['setup'], teardown=case['teardown'], context=self.context,
+                                  frame=self.frame, engine=self.engine)
+            else:
+                continue
+            test_suite.addTest(test)
+        return test_suite
+
+
+class JsonParser(Parser):
+
+    def normalize(self):
         with open(self.testfile, 'rb') as fp:
             parsed = json.load(fp=fp)
 
         try:
-            self.project = parsed['project']
+            project = {'name': parsed['project']}
         except KeyError:
             raise KeyError('Key "project" is Required.')
-        self.api_type = parsed.get('type', 'http').lower()
-        self.desc = parsed.get('desc', '')
-        # debug
-        logger.debug('project: %s, desc: %s' % (self.project, self.desc))
-        logger.debug('type: %s' % self.api_type)
-
-        tests = parsed['tests']
-        if self.api_type in ('http', 'rest', 'restful'):
-            # RESTFul interface (HTTP protocol)
-            base = parsed.get('base', '')
-            if base:
-                logger.debug('base: %s' % base)
-            for test in tests:
-                case = test.get('case', 'Unnamed')
-                case_desc = test.get('desc', '')
-                logger.debug('case: %s, desc: %s' % (case, case_desc))
-                # setup teardown test method
-                setup = test.get('setup')
-                teardown = test.get('teardown')
-                tcase = test.get('test')
-
-                r = RestTest(name=case, desc=case_desc, base=base, test=tcase, setup=setup, teardown=teardown)
-                testcases.append(r)
-        elif self.api_type in ('tcp', 'socket'):
-            # socket interface (TCP protocol)
-            ip = parsed.get('ip', '127.0.0.1')
-            port = parsed.get('port', 3000)
-            for test in tests:
-                case = test.get('case', 'Unnamed')
-                case_desc = test.get('desc', '')
-                logger.debug('case: %s, desc: %s' % (case, case_desc))
-                # setup teardown test method
-                setup = test.get('setup')
-                teardown = test.get('teardown')
-                tcase = test.get('test')
-
-                r = SocketTest(name=case, desc=case_desc, ip=ip, port=port, test=tcase, setup=setup, teardown=teardown)
-                testcases.append(r)
-        else:
-            pass
+        project['type'] = parsed.get('type', 'http').lower()
+        project['desc'] = parsed.get('desc', '')
+        project['base'] = parsed.get('base', '')
+        project['ip'] = parsed.get('ip', '127.0.0.1')
+        project['port'] = parsed.get('port', 3000)
+        project['frame'] = lowercase_keys(parsed.get('frame'))
+        project['engine'] = parsed.get('engine')
+        project['bindings'] = parsed.get('bindings')
+        project['pool'] = lowercase_keys(parsed.get('pool'))  # HTTP connection pool: {"size": 10, "keepalive": 60}
+        project['cache'] = lowercase_keys(parsed.get('cache'))  # response cache: true or {"size": 1024}
+
+        cases = list()
+        for test in parsed['tests']:
+            case = test.get('case', 'Unnamed')
+            case_desc = test.get('desc', '')
+            logger.debug('case: %s, desc: %s' % (case, case_desc))
+            # setup teardown test method
+            cases.append({
+                'name': case,
+                'desc': case_desc,
+                'setup': test.get('setup'),
+                'test': test.get('test'),
+                'teardown': test.get('teardown')
+            })
+        suite = {'name': project['name'], 'desc': project['desc'], 'sequential': parsed.get('sequential'),
+                 'cases': cases}
+        return project, [suite]
 
 
 def flatten_dictionaries(input):
@@ -168,36 +303,31 @@ def lowercase_keys(input_dict):
 def safe_substitute_template(template_string, variable_map):
     """ 用 string.Template 的 safe_substitute 方法将传入的模板string 使用 variable_map进行解析，替换模板变量，返回str """
 
-    my_template = string.Template(template_string)
-    my_escaped_dict = dict(map(lambda x: (x[0], x[1]), variable_map.items()))
-    templated = my_template.safe_substitute(my_escaped_dict)
-    return templated
+    return compile_template(template_string).safe_substitute(variable_map)
 
 
-class YamlParser(object):
-    def __init__(self, testfile):
-        self.parsed = YamlReader(testfile).yaml
-        self.project = ''
-        self.desc = ''
-        self.api_type = 'http'
-        self.ip = ''
-        self.port = ''
-        self.context = Context()
+class YamlParser(Parser):
 
-    def parse(self):
-        proj_data = lowercase_keys(flatten_dictionaries(lowercase_keys(self.parsed.pop(0)[0]).get('project')))
+    def normalize(self):
+        documents = YamlReader(self.testfile).iter_documents()  # each document after project is a suite
+        proj_data = lowercase_keys(flatten_dictionaries(lowercase_keys(next(documents)[0]).get('project')))
         # print(proj_data)
-        self.project = proj_data.get('name')
-        self.desc = proj_data.get('desc')
-        self.api_type = proj_data.get('type')
-        # debug
-        logger.debug('project: %s, desc: %s, type: %s' % (self.project, self.desc, self.api_type))
-
-        bindings = proj_data.get('bindings')
-        if bindings:
-            self.context.bind_variables(bindings)
-
-        for suite in self.parsed:
+        project = {
+            'name': proj_data.get('name'),
+            'desc': proj_data.get('desc'),
+            'type': (proj_data.get('type') or 'http').lower(),
+            'ip': proj_data.get('ip'),
+            'port': proj_data.get('port'),
+            'frame': lowercase_keys(flatten_dictionaries(proj_data.get('frame'))),
+            'engine': proj_data.get('engine'),
+            'bindings': proj_data.get('bindings'),
+            'pool': lowercase_keys(flatten_dictionaries(proj_data.get('pool'))),  # HTTP connection pool
+            'cache': lowercase_keys(flatten_dictionaries(proj_data.get('cache')))  # response cache
+        }
+        return project, self._suites(documents)
+
+    def _suites(self, documents):
+        for suite in documents:
             suite_data = lowercase_keys(flatten_dictionaries(lowercase_keys(suite.pop(0)).get('suite')))
             suite_name = suite_data.get('name')
             suite_desc = suite_data.get('desc')
@@ -207,89 +337,98 @@ class YamlParser(object):
             if suite_skip:
                 continue
 
-            test_suite = unittest.TestSuite()  # test suite definition
-
+            cases = list()
             for case in suite:
-                # print(case)
-                case_data = list()
-                steps = list()
-                for item in lowercase_keys(case).get('testcase'):
-                    if list(item.keys())[0].lower() != 'step':
-                        case_data.append(lowercase_keys(item))
-                    else:
-                        steps.append(flatten_dictionaries(lowercase_keys(item).get('step')))
-                case_data = flatten_dictionaries(case_data)
-                # print('case_data: %s' % case_data)
-                # print('step %s' % steps)
-
-                case_name = case_data.get('name')
-                case_desc = case_data.get('desc')
-                case_skip = case_data.get('skip')
-                # debug
-                logger.debug('case: %s, desc: %s, skip: %s' % (case_name, case_desc, case_skip))
-
-                if case_skip:
-                    continue
-
-                sorted_test = list()
-                sorted_setup = list()
-                sorted_teardown = list()
-
-                for step in steps:
-                    # print(step)
-                    step_name = step.get('name', 'unnamed')
-                    step_type = step.get('type', 'step')
-                    step_url = step.get('url')  # can be template
-                    if isinstance(step_url, dict):
-                        step_url = safe_substitute_template(step_url['template'], self.context.get_values())
-                    step_method = step.get('method')
-                    step_params = step.get('params')
-                    step_data = step.get('data')
-                    step_validators = step.get('validators')
-                    step_resource = step.get('resource')
-                    if step_resource:
-                        step_resource = flatten_dictionaries(step_resource)
-
-                    sorted_step = {
-                        'name': step_name,
-                        'url': step_url,
-                        'method': step_method,
-                        'params': step_params,
-                        'data': step_data,
-                        'validators': step_validators,
-                        'resource': step_resource
-                    }
-                    if step_type.lower() == 'step':
-                        sorted_test.append(sorted_step)
-                    elif step_type.lower() == 'setup':
-                        sorted_setup.append(sorted_step)
-                    elif step_type.lower() == 'teardown':
-                        sorted_teardown.append(sorted_step)
-
-                if self.api_type in ('http', 'rest', 'restful'):
-                    r = RestTest(name=case_name, test=sorted_test, desc=case_desc, setup=sorted_setup, teardown=sorted_teardown)
-                    test_suite.addTest(r)
-                elif self.api_type in ('tcp', 'socket'):
-                    self.ip = proj_data.get('ip')
-                    self.port = proj_data.get('port')
-                    s = SocketTest(name=case_name, test=sorted_test, ip=self.ip, port=self.port, desc=case_desc, setup=sorted_setup, teardown=sorted_teardown)
-                    test_suite.addTest(s)
-
-            testcases.append(test_suite)
+                normalized = self._case(case)
+                if normalized:
+                    cases.append(normalized)
+
+            yield {'name': suite_name, 'desc': suite_desc, 'sequential': suite_data.get('sequential'),
+                   'cases': cases}
+
+    @staticmethod
+    def _case(case):
+        # print(case)
+        case_data = list()
+        steps = list()
+        for item in lowercase_keys(case).get('testcase'):
+            if list(item.keys())[0].lower() != 'step':
+                case_data.append(lowercase_keys(item))
+            else:
+                steps.append(flatten_dictionaries(lowercase_keys(item).get('step')))
+        case_data = flatten_dictionaries(case_data)
+        # print('case_data: %s' % case_data)
+        # print('step %s' % steps)
+
+        case_name = case_data.get('name')
+        case_desc = case_data.get('desc') or ''
+        case_skip = case_data.get('skip')
+        # debug
+        logger.debug('case: %s, desc: %s, skip: %s' % (case_name, case_desc, case_skip))
+
+        if case_skip:
+            return None
+
+        sorted_test = list()
+        sorted_setup = list()
+        sorted_teardown = list()
+
+        for step in steps:
+            # print(step)
+            step_type = step.get('type', 'step')
+            step_resource = step.get('resource')
+            if step_resource:
+                step_resource = flatten_dictionaries(step_resource)
+            step_auth = step.get('auth')
+            if isinstance(step_auth, list):
+                step_auth = flatten_dictionaries(step_auth)
+
+            sorted_step = {
+                'name': step.get('name', 'unnamed'),
+                'url': step.get('url'),  # url, headers, params, data can be {template: ...}
+                'method': step.get('method'),
+                'headers': step.get('headers'),
+                'params': step.get('params'),
+                'data': step.get('data'),
+                'validators': step.get('validators'),
+                'resource': step_resource,
+                'pipeline': step.get('pipeline'),
+                'scope': step.get('scope'),  # setup / teardown scope: suite, case or row
+                'auth': step_auth,  # login step in setup, see utils.auth
+                'stream': step.get('stream')  # receive the response body in chunks
+            }
+            if step_type.lower() == 'step':
+                sorted_test.append(sorted_step)
+            elif step_type.lower() == 'setup':
+                sorted_setup.append(sorted_step)
+            elif step_type.lower() == 'teardown':
+                sorted_teardown.append(sorted_step)
+
+        return {'name': case_name, 'desc': case_desc, 'setup': sorted_setup, 'test': sorted_test,
+                'teardown': sorted_teardown}
 
 
 class Runner(object):
-    def __init__(self, project, api_type='http', desc='', runner='text', path=BASE_DIR, report=''):
+    def __init__(self, project, api_type='http', desc='', runner='text', path=BASE_DIR, report='', workers=1):
         self.title = '%s 测试报告' % project
         self.desc = '测试类型：%s， 项目描述：%s' % (api_type, desc)
         self.runner = runner
         self.path = path
         self.report = report
+        self.workers = workers
 
     def run(self, tests):
         import unittest
-        suite = unittest.TestSuite()
-        suite.addTests(tests)
+        LATENCY.clear()
+        if self.workers > 1:
+            from utils.parallel import ParallelSuite
+            suite = ParallelSuite(workers=self.workers)
+        else:
+            suite = unittest.TestSuite()
+        if isinstance(tests, list):
+            suite.addTests(tests)
+        else:  # stream mode, tests are generated while running
+            suite.addTest(StreamSuite(tests))
         if self.runner == 'text':
             unittest.TextTestRunner(verbosity=2).run(suite)
         elif self.runner == 'web':
@@ -307,6 +446,55 @@ class Runner(object):
                                description=self.desc,
                                verbosity=2).run(suite)
 
+        close_pools()
+
+
+def close_pools():
+    """执行还没有执行的 suite teardown，输出连接复用情况，关闭所有连接，结束录制或回放"""
+    close_fixtures()
+    stats = SESSION_POOL.stats()
+    logger.info('HTTP connections: opened %d, reused %d' % (stats['opened'], stats['reused']))
+    SESSION_POOL.close()
+    stats = TCP_POOL.stats()
+    if stats['opened']:
+        logger.info('TCP connections: opened %d, reused %d' % (stats['opened'], stats['reused']))
+    TCP_POOL.close()
+    ASYNC_ENGINE.close()
+    RESPONSE_CACHE.close()
+    CASSETTE.close()
+
+
+def select_cases(suites, name=None):
+    """返回 suites 中名称为 name 的 suite 中的所有用例，或名称为 name 的用例；name 为 None 时返回所有用例"""
+    selected = list()
+    for suite in suites:
+        for test in suite:
+            if name is None or name in (getattr(suite, 'name', None), test.name):
+                selected.append(test)
+    if not selected:
+        raise ParameterError('Case or suite not found: %s' % name)
+    return selected
+
+
+def run_load(tp, parser):
+    """--load：用 tp.users 个虚拟用户压测选中的用例，指定 tp.rate 时按到达速率压测"""
+    from utils.load import LoadRunner, OpenLoadRunner, ArrivalSchedule
+    if tp.rate and not (tp.duration or tp.iterations):
+        raise ParameterError('--rate needs --duration or --iterations, otherwise the load test never stops')
+    parser.parse()
+    tests = select_cases(testcases, tp.case)
+    try:
+        if tp.rate:
+            try:
+                schedule = ArrivalSchedule.parse(tp.rate, tp.duration)
+            except ValueError as e:
+                raise ParameterError(str(e))
+            OpenLoadRunner(tests, schedule, users=tp.users or OPEN_LOAD_USERS, iterations=tp.iterations).run()
+        else:
+            LoadRunner(tests, users=tp.users or 1, duration=tp.duration, iterations=tp.iterations).run()
+    finally:
+        close_pools()
+
 
 def main():
     # argvs = sys.argv
@@ -315,21 +503,33 @@ def main():
     tp.parse_args(argvs)
 
     if tp.testfile.split('.')[-1].lower() == 'json':
-        parser = JsonParser(tp.testfile)
+        parser = JsonParser(tp.testfile, tp.engine)
     elif tp.testfile.split('.')[-1].lower() in ['yaml', 'yml']:
-        parser = YamlParser(tp.testfile)
+        parser = YamlParser(tp.testfile, tp.engine)
     else:
         raise FileTypeNotSupportException('文件类型不支持解析，请传入json或yaml格式配置文件')
 
-    parser.parse()
+    if tp.cassette:
+        CASSETTE.open(*tp.cassette)
+
+    if tp.load:
+        run_load(tp, parser)
+        return
+
+    if tp.stream:
+        tests = parser.stream()
+    else:
+        parser.parse()
+        tests = testcases
 
     Runner(project=parser.project,
            api_type=parser.api_type,
            desc=parser.desc,
            path=tp.path,
            report=tp.report,
-           runner=tp.runner
-           ).run(testcases)
+           runner=tp.runner,
+           workers=tp.workers
+           ).run(tests)
 
 
 def runwithargs(path, case_file, reporttype='web', reportfile=None):
@@ -341,21 +541,30 @@ def runwithargs(path, case_file, reporttype='web', reportfile=None):
     tp.parse_args(argvs)
 
     if tp.testfile.split('.')[-1].lower() == 'json':
-        parser = JsonParser(tp.testfile)
+        parser = JsonParser(tp.testfile, tp.engine)
     elif tp.testfile.split('.')[-1].lower() in ['yaml', 'yml']:
-        parser = YamlParser(tp.testfile)
+        parser = YamlParser(tp.testfile, tp.engine)
     else:
         raise FileTypeNotSupportException('文件类型不支持解析，请传入json或yaml格式配置文件')
 
-    parser.parse()
+    if tp.load:
+        run_load(tp, parser)
+        return
+
+    if tp.stream:
+        tests = parser.stream()
+    else:
+        parser.parse()
+        tests = testcases
 
     Runner(project=parser.project,
            api_type=parser.api_type,
            desc=parser.desc,
            path=tp.path,
            report=tp.report,
-           runner=tp.runner
-           ).run(testcases)
+           runner=tp.runner,
+           workers=tp.workers
+           ).run(tests)
 
 
 if __name__ == '__main__':